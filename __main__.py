@@ -4,27 +4,38 @@ Simply run `python3 tests` from the root directory to run the tests.
 
 Notes:
 - To avoid over use of the stack exchange api the responses will be cached.
+- Scraper responses can be cached briefly with `--cache-scraper`, only use this when the scraper has not changed
+  since the previous run, otherwise the tests will compare against its old responses.
 - This script will set the `STACKOVERFLOW_API_PORT` environment variable.
 
 Usage:
     tests [options] [<test_id> ...]
 
 Options:
-    -h --help       Show this screen
-    --port=<port>   The port to use for the api [default: 5000]
+    -h --help           Show this screen
+    --port=<port>       The port to use for the api [default: 5000]
+    --workers=<n>       The number of tests to run at the same time, use 1 to run them one at a time [default: 8]
+    --cache-scraper     Reuse scraper responses from recent runs instead of querying the scraper
 
 Examples:
     tests 1
 """
 
 import atexit
-import json
+import hashlib
 import logging
 import os
+import re
+import threading
+from collections import deque
+from collections.abc import Set
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from time import sleep
+from urllib.parse import parse_qsl, urlencode
 
-import requests
+import httpx
+import orjson
 from deepdiff import DeepDiff
 from docopt import docopt
 from dotenv import load_dotenv
@@ -47,6 +58,7 @@ GLOBAL_POPS = [
     'azure-ad-role',
     'azure-object-anchors'
 ]
+GLOBAL_POPSET = frozenset(GLOBAL_POPS)
 
 GLOBAL_IGNORE_DIFF_CONTAINING = [
     # 'email-protection'
@@ -56,6 +68,7 @@ GLOBAL_IGNORE_DIFF_CONTAINING = [
 # Paths
 BASE_PATH = os.path.abspath(__file__).replace("__main__.py", "")
 API_DIR = os.path.join(BASE_PATH, "api_cache")
+SCRAPER_CACHE_DIR = os.path.join(BASE_PATH, "scraper_cache")
 LOG_DIR = os.path.join(BASE_PATH, "logs")
 RESULTS_DIR = os.path.join(os.getcwd(), "results")
 TEST_CASES_PATH = os.path.join(BASE_PATH, "test_cases.json")
@@ -69,6 +82,36 @@ SCRAPER_PORT = args.get(
 os.environ.setdefault('STACKOVERFLOW_API_PORT', SCRAPER_PORT)
 
 
+# Time in seconds to cache scraper responses for
+SCRAPER_CACHE_TTL = 60
+
+# Number of tests to run concurrently
+MAX_WORKERS = max(1, int(args['--workers']))
+
+# Scraper startup probing
+STARTUP_RETRIES = 20
+STARTUP_MAX_DELAY = 2.0  # seconds
+
+
+# Cache lifetime multipliers by endpoint prefix, the first match is used (default 1.0)
+# Static endpoints can be cached for longer, volatile ones should be refreshed more often
+TTL_MULTIPLIERS = {
+    '/info': 12.0,
+    '/tags': 6.0,
+    '/collectives': 6.0,
+    '/questions': 0.5,
+}
+
+
+# Routes that the api can serve for many ids at once, with the item id field
+BATCHABLE_ROUTES = {
+    'questions': 'question_id',
+    'answers': 'answer_id',
+}
+BATCHABLE_PATTERN = re.compile(r"^/(questions|answers)/(\d+)$")
+BATCH_SIZE = 100  # max ids per request allowed by the api
+
+
 # URLs
 SCRAPER_URL = f"http://localhost:{SCRAPER_PORT}"
 API_URL = "https://api.stackexchange.com/2.3"  # must include ?site=stackoverflow
@@ -76,6 +119,7 @@ API_URL = "https://api.stackexchange.com/2.3"  # must include ?site=stackoverflo
 
 # Create the directories
 os.makedirs(API_DIR, exist_ok=True)
+os.makedirs(SCRAPER_CACHE_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
@@ -91,6 +135,23 @@ if not os.path.exists(TEST_CASES_PATH):
 logger = logging.getLogger()
 
 
+# Shared HTTP client, keeps connections alive between requests
+# HTTP/2 multiplexes the concurrent requests to the api over a single connection
+CLIENT = httpx.Client(
+    http2=True,
+    timeout=30,
+    follow_redirects=True,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+)
+
+# The scraper may take a while to scrape a page, so do not limit how long it takes to respond
+SCRAPER_TIMEOUT = httpx.Timeout(30, read=None)
+
+# Requests in progress by url, so concurrent refreshes of the same url share one request
+_INFLIGHT: dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
 class CustomFormatter(logging.Formatter):
 
     _colorRules = {
@@ -111,36 +172,60 @@ class CustomFormatter(logging.Formatter):
         if additional_rules:
             self._colorRules.update(additional_rules)
 
+        # Match all the rules in a single pass, longest first so overlapping rules prefer the longer one
+        self._pattern = re.compile('|'.join(
+            re.escape(rule) for rule in sorted(self._colorRules, key=len, reverse=True)))
+
+    def _color(self, match):
+        return self._colorRules[match.group(0)](match.group(0))
+
     def format(self, record):
-        formatted_str = super().format(record)
+        return self._pattern.sub(self._color, super().format(record))
+
 
-        for rule in self._colorRules:
-            formatted_str = formatted_str.replace(
-                rule, self._colorRules[rule](rule))
+def canonical_url(url: str, params: list[tuple[str, str]]) -> str:
+    """
+    Join a url and its query parameters, with the parameters sorted by key so their order does not matter.
+    Repeated keys keep their relative order.
 
-        return formatted_str
+    :param url: The url, without the query string
+    :param params: The query parameters, as (key, value) pairs
+    :return: The url with the sorted query string
+    """
 
+    return f"{url}?{urlencode(sorted(map(tuple, params), key=lambda param: param[0]))}"
 
-class API_Cache:
+
+class HTTP_Cache:
     """
-    A class to cache the results of an API request
+    A class to cache the results of an HTTP request
     """
 
-    def __init__(self, url, update_interval=600):
+    def __init__(self, url, params=None, update_interval=600, ttl_multiplier=1.0, cache_dir=API_DIR):
         """
-        Creates a new API_Cache object
+        Creates a new HTTP_Cache object
 
-        :param url: The url to cache
+        :param url: The url to cache, without the query string
+        :param params: The query parameters of the request, as (key, value) pairs (default none)
         :param update_interval: The time in seconds between updates (default 10 minutes)
+        :param ttl_multiplier: The factor to scale the update interval by (default 1.0)
+        :param cache_dir: The directory to store the cache file in (default the api cache)
         """
         self.meta = {
             'last_update': 0,
             'url': url,
-            'update_interval': update_interval
+            'params': params or [],
+            'update_interval': update_interval,
+            'ttl_multiplier': ttl_multiplier
         }
         self.cache = {}
+        self._loaded = False
+        self._mtime = 0
 
-        self.file_path = f"{API_DIR}/{self.meta['url'].replace("/", "_")}.json"
+        self.key = canonical_url(url, self.meta['params'])
+        # Hash the url for a short, fixed length file name, the url itself is kept in the meta
+        digest = hashlib.blake2b(self.key.encode(), digest_size=16).hexdigest()
+        self.file_path = os.path.join(cache_dir, f"{digest}.json")
 
         if not os.path.exists(self.file_path):
             self._save()
@@ -155,39 +240,102 @@ class API_Cache:
         :return: The cache
         """
 
-        self._load()
-
-        if (datetime.now().timestamp() - self.meta['last_update']) > self.meta['update_interval']:
+        if self.peek() is None:
             self.refresh()
 
         return self.cache
 
+    def peek(self) -> dict | None:
+        """
+        Get the contents of the cache file without updating it.
+
+        :return: The cache, or None if it is out of date
+        """
+
+        # Only read the file if it has not been read yet, or was changed by someone else
+        if not self._loaded or os.path.getmtime(self.file_path) > self._mtime:
+            self._load()
+
+        return None if self.is_stale() else self.cache
+
+    def is_stale(self) -> bool:
+        """
+        Check if the cache is out of date.
+
+        :return: True if the cache should be refreshed
+        """
+
+        interval = self.meta['update_interval'] * self.meta.get('ttl_multiplier', 1.0)
+        return (datetime.now().timestamp() - self.meta['last_update']) > interval
+
+    def update(self, data: dict):
+        """
+        Replace the contents of the cache and save it to the cache file.
+
+        :param data: The new contents of the cache
+        """
+
+        self.cache = data
+        self.meta['last_update'] = datetime.now().timestamp()
+
+        self._save()
+
     def refresh(self):
         """
         Query the URL and update the cache upon success.
+        If the URL is already being queried (e.g. by another test), wait for that response instead.
         """
 
+        with _INFLIGHT_LOCK:
+            future = _INFLIGHT.get(self.key)
+            owner = future is None
+            if owner:
+                future = _INFLIGHT[self.key] = Future()
+
+        if not owner:
+            data = future.result()
+            if data is not None:
+                self.cache = data
+                self.meta['last_update'] = datetime.now().timestamp()
+            return
+
+        data = None
         try:
-            response = requests.get(self.meta['url'])
-        except requests.exceptions.RequestException as e:
-            logger.warning(
-                f"Request to {self.meta['url']} failed. No changes will be made to the cache.")
+            data = self._request()
+            if data is not None:
+                self.update(data)
+        finally:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(self.key)
+            future.set_result(data)
+
+    def _request(self) -> dict | None:
+        """
+        Query the URL.
+
+        :return: The response, or None if the request failed
+        """
+
+        try:
+            response = CLIENT.get(self.meta['url'], params=self.meta['params'])
+        except httpx.HTTPError as e:
+            logger.warning("Request to %s failed. No changes will be made to the cache.", self.key)
             logger.debug(e)
-            return
+            return None
 
         if response.status_code != 200:
-            logger.warning(f"Erroneous response from {self.meta['url']}: {response.status_code}. No changes will be made to the cache.")
+            logger.warning(
+                "Erroneous response from %s: %s. No changes will be made to the cache.", self.key, response.status_code)
             logger.debug(response.text)
-            return
+            return None
 
-        self.cache = response.json()
-        self.meta['last_update'] = datetime.now().timestamp()
-
-        self._save()
+        return response.json()
 
     def _save(self):
         """
-        Save the cache to the cache file
+        Save the cache to the cache file.
+        The file is written to a temporary file first and then moved into place, so a concurrent reader
+        never sees a partially written cache.
         """
 
         data = {
@@ -195,19 +343,58 @@ class API_Cache:
             'cache': self.cache
         }
 
-        with open(self.file_path, "w") as f:
-            f.write(json.dumps(data))
+        # Unique per thread, and created with open so the file gets the default (umask) permissions
+        tmp_path = f"{self.file_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(orjson.dumps(data))
+
+            os.replace(tmp_path, self.file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._mtime = os.path.getmtime(self.file_path)
+        self._loaded = True
 
     def _load(self):
         """
         Load the cache from the cache file
         """
 
-        with open(self.file_path, "r") as f:
-            data = json.loads(f.read())
+        with open(self.file_path, "rb") as f:
+            data = orjson.loads(f.read())
 
-        self.meta = data['meta']
+        # Keep the configured multiplier, so changes to `TTL_MULTIPLIERS` apply to existing caches
+        self.meta = {**data['meta'], 'ttl_multiplier': self.meta['ttl_multiplier']}
         self.cache = data['cache']
+        self._mtime = os.path.getmtime(self.file_path)
+        self._loaded = True
+
+
+# HTTP_Cache instances by canonical url, so tests that share a url share the loaded cache
+_CACHES: dict[str, HTTP_Cache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(url: str, params: list[tuple[str, str]], **kwargs) -> HTTP_Cache:
+    """
+    Get the HTTP_Cache of a url, creating it on first use.
+    Keyword arguments are passed to the HTTP_Cache constructor and are only used when it is created.
+
+    :param url: The url to cache, without the query string
+    :param params: The query parameters of the request, as (key, value) pairs
+    :return: The HTTP_Cache of the url
+    """
+
+    key = canonical_url(url, params)
+
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = HTTP_Cache(url, params, **kwargs)
+
+        return _CACHES[key]
 
 
 def setup_logger():
@@ -235,7 +422,7 @@ def setup_logger():
     logger.addHandler(fh)
 
 
-def dynamic_pop(data: dict, pops: list[str]):
+def dynamic_pop(data: dict, pops: list[str] | set[str] | frozenset[str]):
     """
     Recursively remove keys and values from a dictionary or list.
 
@@ -264,25 +451,23 @@ def dynamic_pop(data: dict, pops: list[str]):
     }
 
     :param data: The data to remove items from
-    :param pops: The keys or values to remove
+    :param pops: The keys or values to remove, pass a set to avoid converting it on every call
     :return: The data with the items removed
     """
 
-    def remove_items(d, pops):
-        if isinstance(d, dict):
-            keys_to_remove = [key for key in d if key in pops]
-            for key in keys_to_remove:
-                d.pop(key)
-            for key, value in d.items():
-                remove_items(value, pops)
-        elif isinstance(d, list):
-            items_to_remove = [item for item in d if item in pops]
-            for item in items_to_remove:
-                d.remove(item)
-            for item in d:
-                remove_items(item, pops)
+    popset = pops if isinstance(pops, (set, frozenset)) else frozenset(pops)
+    stack = deque([data])
 
-    remove_items(data, pops)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key in [key for key in node if key in popset]:
+                del node[key]
+            stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+        elif isinstance(node, list):
+            # Containers are unhashable and can never be one of the pops
+            node[:] = [x for x in node if isinstance(x, (dict, list)) or x not in popset]
+            stack.extend(x for x in node if isinstance(x, (dict, list)))
 
 
 def remove_from_diff(diff: dict, pops: list[str]):
@@ -308,28 +493,16 @@ def remove_from_diff(diff: dict, pops: list[str]):
     :param pops: The strings to check for in the diff
     """
 
-    to_pop = []
-    if 'values_changed' in diff:
-        for key in diff['values_changed']:
-            for old_new in diff['values_changed'][key].values():
-                for check in pops:
-                    if (isinstance(old_new, str)) and check in old_new:
-                        to_pop.append(key)
-                        break
-
-    for key in to_pop:
-        diff['values_changed'].pop(key)
+    values_changed = diff.get('values_changed', {})
+    if pops:
+        for key in [
+            key for key, old_new in values_changed.items()
+            if any(isinstance(value, str) and any(check in value for check in pops) for value in old_new.values())
+        ]:
+            values_changed.pop(key)
 
     # if any values are empty dicts or lists, remove them
-    to_pop = []
-    for key in diff.keys():
-        if diff[key] == {}:
-            to_pop.append(key)
-        elif isinstance(diff[key], list):
-            if len(diff[key]) == 0:
-                to_pop.append(key)
-
-    for key in to_pop:
+    for key in [key for key, value in diff.items() if value in ({}, [])]:
         diff.pop(key)
 
 
@@ -362,6 +535,127 @@ def validate_order(t1, t2, comparison_keys):
     return None if len(mismatches) == 0 else mismatches
 
 
+def json_default(obj):
+    """
+    Convert the values DeepDiff produces that orjson can not serialize.
+    Sets (e.g. the added/removed item paths) become lists, types (e.g. in type changes) their name,
+    anything else its string representation.
+
+    :param obj: The object to convert
+    :return: A json serializable representation of the object
+    """
+
+    if isinstance(obj, Set):
+        return list(obj)
+
+    if isinstance(obj, type):
+        return obj.__name__
+
+    return str(obj)
+
+
+def write_result(path: str, out: dict):
+    """
+    Write a test result to a json file.
+
+    :param path: The path of the result file
+    :param out: The result to write
+    """
+
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(out, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS, default=json_default))
+
+
+def parse_endpoint(endpoint: str):
+    """
+    Split a test case into its endpoint and query parameters.
+    The `site=stackoverflow` query is always appended.
+
+    :param endpoint: The test case, an endpoint with an optional query string
+    :return: The endpoint and the query parameters, as (key, value) pairs
+    """
+
+    endpoint, _, query_string = endpoint.strip().partition("?")
+    params = parse_qsl(query_string, keep_blank_values=True)
+    params.append(('site', 'stackoverflow'))
+
+    return endpoint, params
+
+
+def ttl_multiplier(endpoint: str) -> float:
+    """
+    Get the cache lifetime multiplier of an endpoint from `TTL_MULTIPLIERS`.
+
+    :param endpoint: The endpoint, without the query string
+    :return: The multiplier of the first matching prefix, or 1.0 if none match
+    """
+
+    return next((m for prefix, m in TTL_MULTIPLIERS.items() if endpoint.startswith(prefix)), 1.0)
+
+
+def prefetch_batched(test_cases: list[str]):
+    """
+    Populate the api caches of batchable test cases (e.g. `/questions/{id}`) using as few api requests as possible.
+    Stale caches that share a route and query string are fetched together with semicolon separated ids,
+    and the response is split by id into the cache of each test case.
+
+    Any test case that could not be populated will fall back to its own request when it is run.
+
+    :param test_cases: The test cases that will be run
+    """
+
+    groups = {}
+    for test in test_cases:
+        endpoint, params = parse_endpoint(test)
+        match = BATCHABLE_PATTERN.match(endpoint)
+        if match is None:
+            continue
+
+        # Totals can not be split per id, and the page size is set by the batch
+        if ('filter', 'total') in params or any(key == 'pagesize' for key, _ in params):
+            continue
+
+        route, item_id = match.groups()
+        cached_api = get_cache(f"{API_URL}{endpoint}", params, ttl_multiplier=ttl_multiplier(endpoint))
+        if cached_api.peek() is not None:
+            continue
+
+        # Group by route and query parameters, the params are kept to make the batched request
+        _, _, caches = groups.setdefault(canonical_url(route, params), (route, params, {}))
+        caches[int(item_id)] = cached_api
+
+    for route, params, caches in groups.values():
+        if len(caches) < 2:
+            continue
+
+        ids = list(caches)
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            url = f"{API_URL}/{route}/{';'.join(map(str, batch))}"
+
+            try:
+                response = CLIENT.get(url, params=[*params, ('pagesize', BATCH_SIZE)])
+            except httpx.HTTPError as e:
+                logger.warning("Batched request to %s failed. Falling back to individual requests.", url)
+                logger.debug(e)
+                continue
+
+            if response.status_code != 200:
+                logger.warning(
+                    "Erroneous response from %s: %s. Falling back to individual requests.", url, response.status_code)
+                logger.debug(response.text)
+                continue
+
+            data = response.json()
+            items = {item.get(BATCHABLE_ROUTES[route]): item for item in data.get('items', [])}
+
+            for item_id in batch:
+                if item_id not in items:
+                    continue
+
+                caches[item_id].update({**data, 'items': [items[item_id]]})
+
+
 def run_test(id: int, endpoint: str):
     """
     Make a call to the cached api and the scraper endpoints and compare the results.
@@ -370,60 +664,90 @@ def run_test(id: int, endpoint: str):
     :param endpoint: The endpoint to compare
     """
 
-    split_endpoint = endpoint.strip().split("?")
-    endpoint = split_endpoint[0]
-    queries = split_endpoint[1].split("&") if len(split_endpoint) > 1 else []
-    queries.append("site=stackoverflow")
+    endpoint, params = parse_endpoint(endpoint)
+    queries = [urlencode([param]) for param in params]
 
-    logger.info(f"Test {id} [START] : {endpoint}?{'&'.join(queries)}")
+    logger.info("Test %d [START] : %s", id, canonical_url(endpoint, params))
 
     # Get the cached response
-    logger.info(f"Test {id} [RUNNING] : Getting API response")
-    cached_api = API_Cache(f"{API_URL}{endpoint}?{'&'.join(queries)}")
+    logger.info("Test %d [RUNNING] : Getting API response", id)
+    cached_api = get_cache(f"{API_URL}{endpoint}", params, ttl_multiplier=ttl_multiplier(endpoint))
     cached_response = cached_api.fetch()
 
-    # Get the response from the scraper
-    logger.info(f"Test {id} [RUNNING] : Getting Scraper response")
-    response = requests.get(f"{SCRAPER_URL}{endpoint}?{'&'.join(queries)}")
+    # Get the response from the scraper, only successful responses are cached
+    logger.info("Test %d [RUNNING] : Getting Scraper response", id)
+    scraper_cache = None
+    scraper_response = None
+    if args['--cache-scraper']:
+        scraper_cache = get_cache(
+            f"{SCRAPER_URL}{endpoint}", params, update_interval=SCRAPER_CACHE_TTL, cache_dir=SCRAPER_CACHE_DIR)
+        scraper_response = scraper_cache.peek()
 
-    # Compare the responses
-    if response.status_code != 200:
-        logger.error(
-            f"Test {id} [FAIL] - Bad response code: {response.status_code} : {response.text}")
+    if scraper_response is None:
+        try:
+            response = CLIENT.get(f"{SCRAPER_URL}{endpoint}", params=params, timeout=SCRAPER_TIMEOUT)
+        except httpx.HTTPError as e:
+            logger.error("Test %d [FAIL] - Request failed: %s", id, e)
+
+            out = {
+                'endpoint': endpoint,
+                'queries': queries,
+                'error': repr(e),
+            }
+            write_result(f'{RESULTS_DIR}/{str(id).zfill(2)}-[ERROR].json', out)
+            return
 
-        out = {
-            'endpoint': endpoint,
-            'queries': queries,
-            'response': response.json(),
-        }
-        with open(f'{RESULTS_DIR}/{str(id).zfill(2)}-[ERROR].json', 'w') as f:
-            print(json.dumps(out, indent=4), file=f)
-        return
+        # Compare the responses
+        if response.status_code != 200:
+            logger.error(
+                "Test %d [FAIL] - Bad response code: %s : %s", id, response.status_code, response.text)
+
+            out = {
+                'endpoint': endpoint,
+                'queries': queries,
+                'response': response.json(),
+            }
+            write_result(f'{RESULTS_DIR}/{str(id).zfill(2)}-[ERROR].json', out)
+            return
+
+        scraper_response = response.json()
+        if scraper_cache is not None:
+            scraper_cache.update(scraper_response)
 
-    scraper_response = response.json()
+    # The responses may be shared with other tests through their caches, so copy them before modifying
+    cached_response = orjson.loads(orjson.dumps(cached_response))
+    scraper_response = orjson.loads(orjson.dumps(scraper_response))
 
     # Pop impossible
-    dynamic_pop(cached_response, GLOBAL_POPS)
-    dynamic_pop(scraper_response, GLOBAL_POPS)
-
-    diff = DeepDiff(
-        cached_response,
-        scraper_response,
-        ignore_order=True,
-        significant_digits=2,
-        truncate_datetime='minute'
-    ).to_json()
-    diff = json.loads(diff)
-
-    remove_from_diff(diff, GLOBAL_IGNORE_DIFF_CONTAINING)
-
-    if diff == {}:
-        logger.debug('No differences found, checking order')
-        # If the responses are the same, check the order of the items
-        mismatches = validate_order(
-            cached_response, scraper_response, ['items'])
-        if mismatches is not None:
-            diff['order_changed'] = mismatches
+    dynamic_pop(cached_response, GLOBAL_POPSET)
+    dynamic_pop(scraper_response, GLOBAL_POPSET)
+
+    # Identical responses need no diffing, this is the common case for passing tests
+    if orjson.dumps(cached_response, option=orjson.OPT_SORT_KEYS) == \
+            orjson.dumps(scraper_response, option=orjson.OPT_SORT_KEYS):
+        logger.debug('Responses are identical, skipping diff')
+        diff = {}
+    else:
+        diff = DeepDiff(
+            cached_response,
+            scraper_response,
+            ignore_order=True,
+            significant_digits=2,
+            truncate_datetime='minute',
+            # Cache the item comparisons made when pairing up the unordered items
+            cache_size=5000,
+            cache_tuning_sample_size=500
+        ).to_dict()
+
+        remove_from_diff(diff, GLOBAL_IGNORE_DIFF_CONTAINING)
+
+        if diff == {}:
+            logger.debug('No differences found, checking order')
+            # If the responses are the same, check the order of the items
+            mismatches = validate_order(
+                cached_response, scraper_response, ['items'])
+            if mismatches is not None:
+                diff['order_changed'] = mismatches
 
     out = {
         'endpoint': endpoint,
@@ -435,10 +759,9 @@ def run_test(id: int, endpoint: str):
 
     pass_fail = "[PASS]" if diff == {} else "[FAIL]"
 
-    with open(f'{RESULTS_DIR}/{str(id).zfill(2)}-{pass_fail}.json', 'w') as f:
-        print(json.dumps(out, indent=4), file=f)
+    write_result(f'{RESULTS_DIR}/{str(id).zfill(2)}-{pass_fail}.json', out)
 
-    logger.info(f"Test {id} {pass_fail}")
+    logger.info("Test %d %s", id, pass_fail)
 
 
 @atexit.register
@@ -454,29 +777,27 @@ def exit_service():
 def main():
 
     # Start the scraper service
-    logger.info(f"Starting the scraper service on port {SCRAPER_PORT}")
+    logger.info("Starting the scraper service on port %s", SCRAPER_PORT)
     os.system(f"python3 stackoverflow_scraper.py > {LOG_FILE_TEMPLATE.format(service='scraper')} 2>&1 &")
 
     # Wait for the service to start
+    # Any response means the service is up, back off exponentially between attempts
     logger.info("Waiting for the service to start")
-    retries = 0
-    while True:
-        if retries > 10:
-            logger.error("Failed to start the service")
-            return
-
-        retries += 1
+    delay = 0.1
+    for _ in range(STARTUP_RETRIES):
         try:
-            requests.get(f"{SCRAPER_URL}/this-url-should-not-exist")
-        except requests.exceptions.RequestException:
-            sleep(0.5)
-            continue
-
-        break
+            CLIENT.get(f"{SCRAPER_URL}/this-url-should-not-exist", timeout=2)
+            break
+        except httpx.HTTPError:
+            sleep(delay)
+            delay = min(delay * 2, STARTUP_MAX_DELAY)
+    else:
+        logger.error("Failed to start the service")
+        return
 
     # Load the test cases
-    with open(TEST_CASES_PATH, "r") as f:
-        test_cases = json.loads(f.read())
+    with open(TEST_CASES_PATH, "rb") as f:
+        test_cases = orjson.loads(f.read())
 
     # Rename old results, overwrite the previous old results
     for file in os.listdir(RESULTS_DIR):
@@ -484,11 +805,18 @@ def main():
             os.rename(os.path.join(RESULTS_DIR, file),
                       os.path.join(RESULTS_DIR, f"old_{file}"))
 
-    # Run the tests
-    for idx, test in enumerate(test_cases):
-        if args['<test_id>'] and str(idx+1) not in args['<test_id>']:
-            continue
-        run_test(idx+1, test)
+    # Select the tests to run
+    selected = [
+        (idx+1, test) for idx, test in enumerate(test_cases)
+        if not args['<test_id>'] or str(idx+1) in args['<test_id>']
+    ]
+
+    # Fetch the batchable api responses up front
+    prefetch_batched([test for _, test in selected])
+
+    # Run the tests, they are I/O bound so run them concurrently
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        list(ex.map(lambda item: run_test(*item), selected))
 
 
 if __name__ == "__main__":
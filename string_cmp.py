@@ -1,8 +1,8 @@
-from difflib import SequenceMatcher
+from rapidfuzz.fuzz import ratio
 
 
 def similar(a, b):
-    return SequenceMatcher(None, a, b).ratio()
+    return ratio(a, b) / 100.0
 
 
 print(similar(